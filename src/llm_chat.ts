@@ -19,6 +19,7 @@ export class LLMChatPipeline {
   // parameter states
   private params: tvmjs.TVMObject;
   private kvCache: tvmjs.TVMObject;
+  private decodeInput: tvmjs.NDArray;
   private logitsOnCPU?: tvmjs.NDArray = undefined;
   private filledKVCacheLength = 0;
 
@@ -28,7 +29,7 @@ export class LLMChatPipeline {
   private maxWindowLength;
   private resetStatsPerPrefill = true;
   private stopStr: string;
-  private stopTokens: Array<number>;
+  private stopTokens: Set<number>;
 
   // states
   private outputMessage = "";
@@ -36,6 +37,10 @@ export class LLMChatPipeline {
   private stopTriggered = false;
   private appearedTokens = new Set<number>();
   private conversation : Conversation;
+  // incremental detokenization states
+  private decodedText = "";
+  private detokPrefixOffset = 0;
+  private detokReadOffset = 0;
   // Total amount of seq len prefilled so far
 
   // stats
@@ -76,7 +81,7 @@ export class LLMChatPipeline {
     const metadata = JSON.parse(metadataStr);
     this.maxWindowLength = metadata.max_window_size;
     // TODO(tvm-team): move to conv template
-    this.stopTokens = metadata.stop_tokens;
+    this.stopTokens = new Set<number>(metadata.stop_tokens);
 
     const fcreateCache = this.vm.getFunction("create_kv_cache");
     this.fclearKVCaches = this.tvm.detachFromCurrentScope(
@@ -86,6 +91,10 @@ export class LLMChatPipeline {
     // use extern config for now
     this.kvCache = this.tvm.detachFromCurrentScope(fcreateCache());
     this.filledKVCacheLength = 0;
+    // input buffer reused by every decode step
+    this.decodeInput = this.tvm.detachFromCurrentScope(
+      this.tvm.empty([1, 1], "int32", this.device)
+    );
     tvm.endScope();
   }
 
@@ -95,6 +104,7 @@ export class LLMChatPipeline {
     this.prefill.dispose();
     this.vm.dispose();
     this.kvCache.dispose();
+    this.decodeInput.dispose();
     this.fclearKVCaches.dispose();
     this.logitsOnCPU?.dispose();
     this.tvm.dispose();
@@ -161,6 +171,9 @@ export class LLMChatPipeline {
     this.outputIds = [];
     this.appearedTokens.clear();
     this.outputMessage = "";
+    this.decodedText = "";
+    this.detokPrefixOffset = 0;
+    this.detokReadOffset = 0;
     this.stopTriggered = false;
     const conversation = this.conversation;
 
@@ -200,11 +213,10 @@ export class LLMChatPipeline {
     const tstart = performance.now();
 
     this.tvm.beginScope();
-    const inputData = this.tvm.empty([1, 1], "int32", this.device);
-    inputData.copyFrom(this.outputIds.slice(this.outputIds.length - 1));
+    this.decodeInput.copyFrom([this.outputIds[this.outputIds.length - 1]]);
 
     const logits = this.tvm.detachFromCurrentScope(
-      this.forward(inputData, this.filledKVCacheLength + 1)
+      this.forward(this.decodeInput, this.filledKVCacheLength + 1)
     );
     this.filledKVCacheLength += 1;
     this.tvm.endScope();
@@ -246,12 +258,15 @@ export class LLMChatPipeline {
     this.appearedTokens.add(nextToken);
 
     // if there is a stop token
-    if (this.stopTokens.includes(nextToken)) {
+    if (this.stopTokens.has(nextToken)) {
       this.stopTriggered = true;
     }
 
-    let outputMessage = this.tokenizer.decode(new Int32Array(this.outputIds));
-    const stopPos = outputMessage.lastIndexOf(this.stopStr);
+    // only the newly decoded tail can complete a stop string
+    const searchStart = Math.max(0, this.decodedText.length - this.stopStr.length + 1);
+    this.decodedText += this.decodeNewText();
+    let outputMessage = this.decodedText;
+    const stopPos = outputMessage.indexOf(this.stopStr, searchStart);
     if (stopPos != -1) {
       outputMessage = outputMessage.substring(0, stopPos);
       this.stopTriggered = true;
@@ -263,6 +278,30 @@ export class LLMChatPipeline {
     }
   }
 
+  /**
+   * Decode the text of the newly generated tokens.
+   *
+   * Only the tokens since the last emitted chunk are decoded, together with
+   * the previous chunk as context so that merges and leading spaces resolve
+   * the same way as decoding the full output.
+   *
+   * @returns The newly decoded text, empty if the tail is not yet complete.
+   */
+  private decodeNewText(): string {
+    const prefixText = this.tokenizer.decode(new Int32Array(
+      this.outputIds.slice(this.detokPrefixOffset, this.detokReadOffset)));
+    const newText = this.tokenizer.decode(new Int32Array(
+      this.outputIds.slice(this.detokPrefixOffset)));
+    // wait for more tokens if we are in the middle of a utf-8 sequence
+    if (!this.stopTriggered &&
+        (newText.length <= prefixText.length || newText.endsWith("\uFFFD"))) {
+      return "";
+    }
+    this.detokPrefixOffset = this.detokReadOffset;
+    this.detokReadOffset = this.outputIds.length;
+    return newText.substring(prefixText.length);
+  }
+
   private forward(inputs: tvmjs.NDArray, curPos: number): tvmjs.NDArray {
     this.tvm.beginScope();
     let retValue;
@@ -364,7 +403,7 @@ export class LLMChatPipeline {
     // need shift window and re-encode
     this.logger("need shift window")
     this.filledKVCacheLength = 0;
-    this.fclearKVCaches();
+    this.fclearKVCaches(this.kvCache);
 
     // abandon all tokens we collected
     if (this.conversation.config.add_bos) {